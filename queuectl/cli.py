@@ -4,25 +4,96 @@ import os
 import signal
 from typing import Optional
 from .storage import Storage
-from .worker import start_workers
+from .worker import start_workers, stop_processes, DEFAULT_BATCH_SIZE
 import psutil
 import sys
 import codecs
 import uuid
-import datetime
+import time
 from .dashboard import start_dashboard
-
+from .jsonutil import loads, iter_array, DECODE_ERRORS
+
+# started_at has one-second resolution and is written just after the worker
+# starts; allow this much before treating a newer process as a reused PID
+PID_REUSE_SLACK = 2.0
+
+def _first_byte(f) -> bytes:
+    # first non-whitespace byte, read in small chunks so a minified
+    # single-line file is never pulled into memory just to sniff its format
+    while True:
+        chunk = f.read(4096)
+        if not chunk:
+            return b""
+        head = chunk.lstrip()[:1]
+        if head:
+            return head
+
+def _first_line_is_object(f) -> bool:
+    for line in f:
+        if line.strip():
+            try:
+                return isinstance(loads(line), dict)
+            except DECODE_ERRORS:
+                return False  # a single object spread over several lines
+    return False
+
+def _iter_job_file(path):
+    """
+    Yield job payloads from a file holding one JSON object, a JSON array of
+    objects, or newline-delimited objects (.ndjson, or any file whose first
+    line is a complete object). Exits with a message naming the first entry
+    that isn't an object.
+    """
+    for n, payload in enumerate(_read_job_file(path), 1):
+        if not isinstance(payload, dict):
+            raise SystemExit(f"Invalid job in {path}: entry {n} is not a JSON object: {payload!r:.80}")
+        yield payload
+
+def _read_job_file(path):
+    with open(path, "rb") as f:
+        if f.read(len(codecs.BOM_UTF8)) != codecs.BOM_UTF8:
+            f.seek(0)
+        start = f.tell()
+        head = _first_byte(f)
+        f.seek(start)
+
+        if head == b"[":
+            yield from iter_array(f)
+            return
+        ndjson = path.endswith(".ndjson")
+        if not ndjson and head == b"{":
+            ndjson = _first_line_is_object(f)
+            f.seek(start)
+        if ndjson:
+            for line in f:
+                if line.strip():
+                    yield loads(line)
+        else:
+            yield loads(f.read())
+
+def _job_defaults(db) -> dict:
+    # Fill defaults from config; one query, then merged into each payload
+    # with {**defaults, **payload}
+    cfg = db.all_config()
+    return {"max_retries": int(cfg.get("max_retries", "3")), "state": "pending"}
 
 def cmd_enqueue(args):
     db = Storage(args.db)
 
-    # 1) If --file was provided
+    # 1) If --file was provided: stream every job in it into one batch insert
     if args.file:
-        with codecs.open(args.file, "r", encoding="utf-8-sig") as f:
-            job_json = f.read()
+        try:
+            defaults = _job_defaults(db)
+            job_ids = db.enqueue_many({**defaults, **payload}
+                                      for payload in _iter_job_file(args.file))
+        except DECODE_ERRORS as e:
+            raise SystemExit(f"Invalid JSON input: {e}")
+        for job_id in job_ids:
+            print(job_id)
+        return
 
     # 2) If job JSON was piped via STDIN
-    elif not sys.stdin.isatty():
+    if not sys.stdin.isatty():
         job_json = sys.stdin.read()
 
     # 3) Otherwise, use the positional argument
@@ -30,54 +101,80 @@ def cmd_enqueue(args):
         job_json = args.job_json
 
     try:
-        payload = json.loads(job_json)
+        payload = loads(job_json)
     except json.JSONDecodeError as e:
         raise SystemExit(f"Invalid JSON input: {e}")
+    if not isinstance(payload, dict):
+        raise SystemExit("Invalid JSON input: expected a job object")
 
-    # Fill defaults from config
-    if "max_retries" not in payload:
-        payload["max_retries"] = int(db.config_get("max_retries", "3"))
-    if "state" not in payload:
-        payload["state"] = "pending"
-
-    job_id = db.enqueue(payload)
+    job_id = db.enqueue({**_job_defaults(db), **payload})
     print(job_id)
 
 def cmd_worker_start(args):
     db = Storage(args.db)
     db.clear_stop()
-    start_workers(args.db, args.count)
+    # don't carry an open SQLite connection across the fork into the workers
+    db.close()
+    start_workers(args.db, args.count, args.batch_size)
+
+def _live_worker(pid: int, started_at: float) -> Optional[psutil.Process]:
+    """
+    The running worker process for a registered PID, or None if the PID is
+    gone or has been reused by something else (so we never SIGTERM an
+    unrelated process left behind by a crashed worker). A worker registers
+    after it starts, so a process created later than its row is a reused PID,
+    even if it is another python.
+    """
+    if not psutil.pid_exists(pid):
+        return None
+    try:
+        proc = psutil.Process(pid)
+        name = proc.name().lower()
+        created = proc.create_time()
+    except (psutil.NoSuchProcess, psutil.AccessDenied):
+        return None
+    if created > started_at + PID_REUSE_SLACK:
+        return None
+    if "python" in name or "queuectl" in name:
+        return proc
+    return None
 
 def cmd_worker_stop(args):
     db = Storage(args.db)
     db.request_stop()
     print("Stopping workers...")
 
-    for w in db.list_workers():
-        pid = int(w["pid"])
-        try:
-            p = psutil.Process(pid)
-            p.terminate()   # graceful
-        except psutil.NoSuchProcess:
-            pass
-
-    print("Stop requested. Workers will exit after finishing their current job.")
+    procs, stale = [], []
+    for pid, started_at in db.list_worker_pids():
+        proc = _live_worker(pid, started_at)
+        if proc is None:
+            stale.append(pid)
+        else:
+            procs.append(proc)
+    if stale:
+        db.remove_workers(stale)
+
+    # graceful SIGTERM; only escalate if the user asked for a timeout
+    if args.timeout is None:
+        print("Waiting for workers to finish their current job...")
+    killed = stop_processes(procs, timeout=args.timeout)
+    if killed:
+        print(f"Killed {len(killed)} worker(s) that ignored SIGTERM.")
+    print("Workers stopped.")
 
 def cmd_status(args):
-    db = Storage(args.db)
+    db = Storage(args.db, readonly=True)
     s = db.stats()
     print(json.dumps(s, indent=2))
 
 def cmd_list(args):
-    db = Storage(args.db)
-    rows = db.list_jobs(state=args.state, limit=args.limit)
-    for r in rows:
+    db = Storage(args.db, readonly=True)
+    for r in db.iter_jobs(state=args.state, limit=args.limit, cursor=None):
         print(json.dumps(r))
 
 def cmd_dlq_list(args):
-    db = Storage(args.db)
-    rows = db.list_dlq(limit=args.limit)
-    for r in rows:
+    db = Storage(args.db, readonly=True)
+    for r in db.iter_dlq(limit=args.limit, cursor=None):
         print(json.dumps(r))
 
 def cmd_dlq_retry(args):
@@ -92,7 +189,7 @@ def cmd_config_set(args):
     print("OK")
 
 def cmd_config_get(args):
-    db = Storage(args.db)
+    db = Storage(args.db, readonly=True)
     v = db.config_get(args.key)
     if v is None:
         print("NOT_SET")
@@ -100,22 +197,23 @@ def cmd_config_get(args):
         print(v)
 
 def cmd_config_show(args):
-    db = Storage(args.db)
+    db = Storage(args.db, readonly=True)
     print(json.dumps(db.all_config(), indent=2))
 
 def cmd_run(args):
     db = Storage(args.db)
 
-    job_id = f"job_{datetime.datetime.utcnow().strftime('%Y%m%d_%H%M%S')}_{uuid.uuid4().hex[:6]}"
+    now = time.gmtime()
+    job_id = f"job_{time.strftime('%Y%m%d_%H%M%S', now)}_{uuid.uuid4().hex[:6]}"
+    now_iso = time.strftime("%Y-%m-%dT%H:%M:%SZ", now)
 
     payload = {
+        **_job_defaults(db),
         "id": job_id,
         "command": args.command,
-        "state": "pending",
         "attempts": 0,
-        "max_retries": int(db.config_get("max_retries", "3")),
-        "created_at": datetime.datetime.utcnow().replace(microsecond=0).isoformat() + "Z",
-        "updated_at": datetime.datetime.utcnow().replace(microsecond=0).isoformat() + "Z"
+        "created_at": now_iso,
+        "updated_at": now_iso
     }
 
     db.enqueue(payload)
@@ -129,7 +227,7 @@ def build_parser():
     # Enqueue
     pe = sub.add_parser("enqueue", help="Add a new job to the queue")
     pe.add_argument("job_json", nargs="?", help="Job JSON string")
-    pe.add_argument("--file", "-f", help="Path to job JSON file")
+    pe.add_argument("--file", "-f", help="Path to job JSON file (object, array, or NDJSON)")
     pe.set_defaults(func=cmd_enqueue)
 
     # Worker
@@ -137,9 +235,16 @@ def build_parser():
     pw_sub = pw.add_subparsers(dest="wcmd", required=True)
     pws = pw_sub.add_parser("start", help="Start one or more workers")
     pws.add_argument("--count", type=int, default=1)
+    pws.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE,
+                     help="Jobs each worker claims per DB round-trip (default 1). "
+                          "Larger batches cut DB work for big queues of short jobs, "
+                          "but a worker holds its claimed jobs even while others are idle")
     pws.set_defaults(func=cmd_worker_start)
 
     pwx = pw_sub.add_parser("stop", help="Stop running workers gracefully")
+    pwx.add_argument("--timeout", type=float, default=None,
+                     help="Seconds to wait for workers to finish their current job before "
+                          "killing jobs and workers (default: wait as long as it takes)")
     pwx.set_defaults(func=cmd_worker_stop)
 
     # Status
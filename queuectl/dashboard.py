@@ -1,4 +1,5 @@
-from flask import Flask, render_template_string
+import time
+from flask import Flask
 from .storage import Storage
 
 HTML = """
@@ -56,16 +57,27 @@ h1 { margin-bottom: 5px; }
 </html>
 """
 
+# seconds a rendered page is served to every viewer before it is rebuilt
+CACHE_TTL = 1.0
+
 def start_dashboard(db_path="queuectl.db", port=8000):
-    db = Storage(db_path)
+    db = Storage(db_path, readonly=True)
     app = Flask(__name__)
+    # parse/compile once; Flask's env keeps HTML autoescaping on
+    tmpl = app.jinja_env.from_string(HTML)
+    _cache = {"t": 0.0, "html": None}
 
     @app.route("/")
     def index():
+        now = time.monotonic()
+        if _cache["html"] is not None and now - _cache["t"] < CACHE_TTL:
+            return _cache["html"]
         stats = db.stats()
-        jobs = db.list_jobs(state="all", limit=50)
-        dlq = db.list_dlq(limit=50)
-        return render_template_string(HTML, stats=stats, jobs=jobs, dlq=dlq)
+        jobs = list(db.iter_jobs(state="all", limit=50, cursor=None))
+        dlq = list(db.iter_dlq(limit=50, cursor=None))
+        html = tmpl.render(stats=stats, jobs=jobs, dlq=dlq)
+        _cache["t"], _cache["html"] = now, html
+        return html
 
     print(f"✅ Dashboard running at http://localhost:{port}")
     app.run(port=port)
@@ -0,0 +1,40 @@
+import json
+
+try:
+    import orjson
+except ImportError:  # optional speedup: pip install queuectl[fast]
+    orjson = None
+
+try:
+    import ijson
+except ImportError:  # optional: incremental parsing of large JSON arrays
+    ijson = None
+
+# everything loads()/iter_array() raise for malformed input
+DECODE_ERRORS = (json.JSONDecodeError,) + ((ijson.JSONError,) if ijson is not None else ())
+
+
+def loads(data):
+    """Parse JSON from str or bytes; raises json.JSONDecodeError on bad input."""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
+
+
+def dumps(obj) -> str:
+    """Compact JSON text (orjson has no pretty/spaced mode, so neither do we)."""
+    if orjson is not None:
+        return orjson.dumps(obj).decode()
+    return json.dumps(obj, separators=(",", ":"))
+
+
+def iter_array(f):
+    """
+    Yield the elements of a top-level JSON array read from binary file f.
+    With ijson installed the array is parsed incrementally, so elements are
+    available before the whole file has been read.
+    """
+    if ijson is not None:
+        yield from ijson.items(f, "item", use_float=True)
+    else:
+        yield from loads(f.read())
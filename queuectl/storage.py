@@ -1,13 +1,30 @@
+import atexit
+import calendar
 import sqlite3
+import threading
 import time
-import json
 import os
+import weakref
 from contextlib import contextmanager
-from typing import Optional, List, Dict
+from pathlib import Path
+from typing import Optional, List, Dict, Tuple, Iterator, Iterable
+from .jsonutil import dumps
 
-_SCHEMA = """
-PRAGMA journal_mode=WAL;
+# per-connection settings; journal_mode=WAL is persistent in the file and is
+# set once when the schema is created
+_PRAGMAS = """
 PRAGMA synchronous=NORMAL;
+PRAGMA temp_store=MEMORY;
+PRAGMA cache_size=-20000;
+PRAGMA mmap_size=268435456;
+"""
+
+# bump whenever _SCHEMA changes; _SCHEMA writes it to PRAGMA user_version, and
+# databases already at this version skip the DDL
+_SCHEMA_VERSION = 2
+
+_SCHEMA = f"""
+BEGIN IMMEDIATE;
 
 CREATE TABLE IF NOT EXISTS jobs (
     id TEXT PRIMARY KEY,                 -- user-provided unique-job-id
@@ -20,8 +37,19 @@ CREATE TABLE IF NOT EXISTS jobs (
     updated_at TEXT NOT NULL             -- ISO8601
 );
 
-CREATE INDEX IF NOT EXISTS idx_jobs_state_eta ON jobs(state, eta);
+-- partial indexes over runnable jobs only, so they stay small however many
+-- completed/dead jobs accumulate. idx_jobs_runnable is keyed on the claim
+-- ORDER BY, so claiming walks it in order and stops at LIMIT without a sort;
+-- idx_jobs_pending covers the next-eta lookup.
+DROP INDEX IF EXISTS idx_jobs_state_eta;
+CREATE INDEX IF NOT EXISTS idx_jobs_runnable ON jobs(eta IS NOT NULL, created_at)
+    WHERE state IN ('pending','failed');
+CREATE INDEX IF NOT EXISTS idx_jobs_pending ON jobs(state, eta, created_at)
+    WHERE state IN ('pending','failed');
 CREATE INDEX IF NOT EXISTS idx_jobs_eta ON jobs(eta);
+-- keyset pagination for iter_jobs (newest first)
+CREATE INDEX IF NOT EXISTS idx_jobs_updated ON jobs(updated_at DESC, id DESC);
+CREATE INDEX IF NOT EXISTS idx_jobs_state_updated ON jobs(state, updated_at DESC, id DESC);
 
 CREATE TABLE IF NOT EXISTS dlq (
     id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -31,6 +59,8 @@ CREATE TABLE IF NOT EXISTS dlq (
     failed_at TEXT NOT NULL              -- ISO8601
 );
 
+CREATE INDEX IF NOT EXISTS idx_dlq_failed ON dlq(failed_at DESC, id DESC);
+
 CREATE TABLE IF NOT EXISTS workers (
     pid INTEGER PRIMARY KEY,
     started_at TEXT NOT NULL,
@@ -46,25 +76,254 @@ CREATE TABLE IF NOT EXISTS config (
     k TEXT PRIMARY KEY,
     v TEXT NOT NULL
 );
+
+-- per-state job counts kept current by triggers, so stats() never scans jobs
+CREATE TABLE IF NOT EXISTS counters (
+    state TEXT PRIMARY KEY,
+    n INTEGER NOT NULL DEFAULT 0
+);
+
+-- backfill databases created before the counters existed
+INSERT INTO counters(state, n)
+SELECT state, COUNT(*) FROM jobs
+WHERE NOT EXISTS (SELECT 1 FROM counters)
+GROUP BY state;
+
+CREATE TRIGGER IF NOT EXISTS trg_jobs_count_insert AFTER INSERT ON jobs
+BEGIN
+    INSERT INTO counters(state, n) VALUES(NEW.state, 1)
+    ON CONFLICT(state) DO UPDATE SET n = n + 1;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_jobs_count_update AFTER UPDATE OF state ON jobs
+WHEN OLD.state IS NOT NEW.state
+BEGIN
+    UPDATE counters SET n = n - 1 WHERE state = OLD.state;
+    INSERT INTO counters(state, n) VALUES(NEW.state, 1)
+    ON CONFLICT(state) DO UPDATE SET n = n + 1;
+END;
+
+CREATE TRIGGER IF NOT EXISTS trg_jobs_count_delete AFTER DELETE ON jobs
+BEGIN
+    UPDATE counters SET n = n - 1 WHERE state = OLD.state;
+END;
+
+PRAGMA user_version = {_SCHEMA_VERSION};
+
+COMMIT;
+"""
+
+# Statement text lives at module level so every call passes the identical
+# string object and hits the connection's prepared-statement cache.
+
+_SQL_INSERT_JOB = """
+INSERT INTO jobs(id, command, state, attempts, max_retries, eta, created_at, updated_at)
+VALUES(?,?,?,?,?,?,?,?)
+"""
+
+# iter_jobs variants: [filter by state][has cursor]
+_SQL_ITER_JOBS = "SELECT * FROM jobs ORDER BY updated_at DESC, id DESC LIMIT ?"
+_SQL_ITER_JOBS_AFTER = """
+SELECT * FROM jobs WHERE (updated_at, id) < (?, ?)
+ORDER BY updated_at DESC, id DESC LIMIT ?
+"""
+_SQL_ITER_JOBS_STATE = """
+SELECT * FROM jobs WHERE state = ?
+ORDER BY updated_at DESC, id DESC LIMIT ?
+"""
+_SQL_ITER_JOBS_STATE_AFTER = """
+SELECT * FROM jobs WHERE state = ? AND (updated_at, id) < (?, ?)
+ORDER BY updated_at DESC, id DESC LIMIT ?
+"""
+
+_SQL_GET_JOB = "SELECT * FROM jobs WHERE id = ?"
+_SQL_DELETE_JOB = "DELETE FROM jobs WHERE id=?"
+
+# left to itself the planner picks idx_jobs_state_updated and sorts; INDEXED BY
+# keeps the claim on idx_jobs_runnable (an error, not a silent scan, if the
+# index is ever missing)
+_SQL_CLAIM_ONE = """
+UPDATE jobs SET state='processing', updated_at=?
+WHERE id = (
+    SELECT id FROM jobs INDEXED BY idx_jobs_runnable
+    WHERE state IN ('pending','failed') AND (eta IS NULL OR eta <= ?)
+    ORDER BY eta IS NOT NULL, created_at ASC
+    LIMIT 1
+)
+RETURNING *
+"""
+_SQL_CLAIM_BATCH = """
+UPDATE jobs SET state='processing', updated_at=?
+WHERE id IN (
+    SELECT id FROM jobs INDEXED BY idx_jobs_runnable
+    WHERE state IN ('pending','failed') AND (eta IS NULL OR eta <= ?)
+    ORDER BY eta IS NOT NULL, created_at ASC
+    LIMIT ?
+)
+RETURNING *
+"""
+# fallback claim for SQLite < 3.35 (no RETURNING): select, then mark, inside
+# one BEGIN IMMEDIATE transaction
+_SQL_SELECT_RUNNABLE = """
+SELECT * FROM jobs INDEXED BY idx_jobs_runnable
+WHERE state IN ('pending','failed') AND (eta IS NULL OR eta <= ?)
+ORDER BY eta IS NOT NULL, created_at ASC
+LIMIT ?
+"""
+_SQL_MARK_PROCESSING = "UPDATE jobs SET state='processing', updated_at=? WHERE id=?"
+_SQL_NEXT_ETA = """
+SELECT MIN(eta) FROM jobs
+WHERE state IN ('pending','failed') AND eta > ?
+"""
+_SQL_RELEASE_JOB = "UPDATE jobs SET state='pending', updated_at=? WHERE id=? AND state='processing'"
+
+_SQL_MARK_COMPLETED = "UPDATE jobs SET state='completed', updated_at=?, eta=NULL WHERE id=?"
+_SQL_MARK_FAILED_RETRY = """
+UPDATE jobs SET state='failed', attempts=?, eta=?, updated_at=?
+WHERE id=?
+"""
+_SQL_INSERT_DLQ = "INSERT INTO dlq(job_id, payload, last_error, failed_at) VALUES(?,?,?,?)"
+_SQL_MARK_DEAD = "UPDATE jobs SET state='dead', updated_at=?, eta=NULL WHERE id=?"
+_SQL_GET_DLQ = "SELECT * FROM dlq WHERE job_id=?"
+_SQL_RESET_JOB = """
+UPDATE jobs SET state='pending', attempts=0, eta=NULL, updated_at=?
+WHERE id=?
+"""
+_SQL_DELETE_DLQ = "DELETE FROM dlq WHERE job_id=?"
+_SQL_ITER_DLQ = "SELECT * FROM dlq ORDER BY failed_at DESC, id DESC LIMIT ?"
+_SQL_ITER_DLQ_AFTER = """
+SELECT * FROM dlq WHERE (failed_at, id) < (?, ?)
+ORDER BY failed_at DESC, id DESC LIMIT ?
+"""
+
+_SQL_REGISTER_WORKER = "INSERT OR REPLACE INTO workers(pid, started_at, queues) VALUES(?, ?, ?)"
+_SQL_DEREGISTER_WORKER = "DELETE FROM workers WHERE pid=?"
+_SQL_LIST_WORKERS = "SELECT * FROM workers"
+_SQL_LIST_WORKER_PIDS = "SELECT pid, started_at FROM workers"
+
+_SQL_REQUEST_STOP = "INSERT OR REPLACE INTO control(k, v) VALUES('stop_requested', '1')"
+_SQL_CLEAR_STOP = "DELETE FROM control WHERE k='stop_requested'"
+_SQL_IS_STOP_REQUESTED = "SELECT v FROM control WHERE k='stop_requested'"
+
+_SQL_CONFIG_SET = "INSERT OR REPLACE INTO config(k, v) VALUES(?, ?)"
+_SQL_CONFIG_GET = "SELECT v FROM config WHERE k=?"
+_SQL_CONFIG_ALL = "SELECT k,v FROM config"
+
+_SQL_STATS = """
+SELECT 'state_' || state AS k, n FROM counters WHERE n > 0
+UNION ALL SELECT 'dlq', COUNT(*) FROM dlq
+UNION ALL SELECT 'workers', COUNT(*) FROM workers
 """
 
+_ISO_FMT = "%Y-%m-%dT%H:%M:%SZ"
+
+# UPDATE ... RETURNING needs SQLite 3.35+; older libraries (common in
+# Python 3.8/3.9 builds) claim with a SELECT + UPDATE transaction instead
+_HAS_RETURNING = sqlite3.sqlite_version_info >= (3, 35, 0)
+
 def _now_iso() -> str:
-    import datetime
-    return datetime.datetime.utcnow().replace(microsecond=0).isoformat() + "Z"
+    # second-resolution UTC ISO8601, without building datetime objects
+    return time.strftime(_ISO_FMT, time.gmtime())
+
+class _ThreadConn:
+    """
+    Holds one thread's connection. It lives in that thread's threading.local
+    slot, so when the thread ends the holder is dropped and the connection
+    is closed with it.
+    """
+    __slots__ = ("conn", "__weakref__")
+
+    def __init__(self, conn: sqlite3.Connection):
+        self.conn = conn
+
+    def __del__(self):
+        self.conn.close()
+
+# live Storage objects, for the exit/fork hooks below (weak: don't pin them)
+_instances = weakref.WeakSet()
+# connections inherited across fork(); the child must never use or close them
+_inherited: List["_ThreadConn"] = []
+
+def _close_all():
+    for st in list(_instances):
+        st.close()
+
+def _forget_all_after_fork():
+    # A SQLite connection must not be carried across fork(): the child shares
+    # the parent's lock bookkeeping, and closing it could checkpoint/delete the
+    # WAL under the parent. Park the inherited handles and start fresh.
+    for st in list(_instances):
+        st._forget_connections()
+
+atexit.register(_close_all)
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_forget_all_after_fork)
 
 class Storage:
-    def __init__(self, db_path: str):
+    # seconds a config value read from the DB is trusted before re-reading
+    _cfg_ttl = 5.0
+
+    def __init__(self, db_path: str, readonly: bool = False):
+        """
+        readonly=True opens the database with a read-only URI (mode=ro) for
+        commands that only look at the queue. A missing or outdated database
+        is still opened read-write once so the schema can be created.
+        """
         self.db_path = db_path
+        self.readonly = readonly and os.path.exists(db_path)
+        self._cfg_cache: Dict[str, Tuple[float, Optional[str]]] = {}
+        # one long-lived connection per thread, opened lazily
+        self._local = threading.local()
+        self._holders = weakref.WeakSet()
+        _instances.add(self)
         self._init_db()
 
     def _connect(self) -> sqlite3.Connection:
-        conn = sqlite3.connect(self.db_path, timeout=30, isolation_level=None)
+        holder = getattr(self._local, "holder", None)
+        if holder is not None:
+            return holder.conn
+        if self.readonly:
+            target, uri = Path(self.db_path).resolve().as_uri() + "?mode=ro", True
+        else:
+            target, uri = self.db_path, False
+        conn = sqlite3.connect(target, timeout=30, isolation_level=None, uri=uri,
+                               check_same_thread=False, cached_statements=256)
         conn.row_factory = sqlite3.Row
+        conn.executescript(_PRAGMAS)
+        holder = _ThreadConn(conn)
+        self._local.holder = holder
+        self._holders.add(holder)
         return conn
 
+    def close(self):
+        """Close every thread's connection; they reopen lazily on next use."""
+        for holder in list(self._holders):
+            holder.conn.close()
+        self._holders = weakref.WeakSet()
+        self._local = threading.local()
+
+    def _forget_connections(self):
+        _inherited.extend(self._holders)
+        self._holders = weakref.WeakSet()
+        self._local = threading.local()
+
     def _init_db(self):
-        with self._connect() as con:
+        con = self._connect()
+        # an up-to-date database needs no DDL (and no write lock) at all
+        if con.execute("PRAGMA user_version").fetchone()[0] == _SCHEMA_VERSION:
+            return
+        if self.readonly:
+            # can't create or upgrade the schema through a read-only handle
+            self.close()
+            self.readonly = False
+            con = self._connect()
+        con.execute("PRAGMA journal_mode=WAL")
+        try:
             con.executescript(_SCHEMA)
+        except Exception:
+            if con.in_transaction:
+                con.execute("ROLLBACK")
+            raise
 
     @contextmanager
     def _txn(self, con: sqlite3.Connection):
@@ -72,13 +331,35 @@ class Storage:
         try:
             yield
             con.execute("COMMIT")
-        except Exception:
+        except BaseException:
+            # also on SystemExit/KeyboardInterrupt, e.g. a bad entry halfway
+            # through a lazily consumed enqueue_many
             con.execute("ROLLBACK")
             raise
 
+    @contextmanager
+    def transaction(self):
+        """
+        Group several Storage calls made from this thread into one write
+        transaction (one commit/fsync instead of one per statement).
+        """
+        with self._txn(self._connect()):
+            yield
+
+    def _iter_rows(self, sql: str, params: tuple) -> Iterator[dict]:
+        # step the cursor one row at a time; close it even if the caller
+        # stops early so the read snapshot is released
+        cur = self._connect().execute(sql, params)
+        try:
+            for r in cur:
+                yield dict(r)
+        finally:
+            cur.close()
+
     # ---------- Job primitives ----------
 
-    def enqueue(self, job: Dict) -> str:
+    @staticmethod
+    def _job_params(job: Dict) -> tuple:
         # Supply defaults
         job_id = job["id"]
         created_at = job.get("created_at") or _now_iso()
@@ -88,143 +369,232 @@ class Storage:
         attempts = int(job.get("attempts", 0))
         command = job["command"]
         eta = None  # eligible immediately unless delayed in future iterations
+        return (job_id, command, state, attempts, max_retries, eta, created_at, updated_at)
 
-        with self._connect() as con:
-            con.execute("""
-                INSERT INTO jobs(id, command, state, attempts, max_retries, eta, created_at, updated_at)
-                VALUES(?,?,?,?,?,?,?,?)
-            """, (job_id, command, state, attempts, max_retries, eta, created_at, updated_at))
-        return job_id
-
-    def list_jobs(self, state: Optional[str] = None, limit: int = 100) -> list:
-        q = "SELECT * FROM jobs"
-        params = []
+    def enqueue(self, job: Dict) -> str:
+        params = self._job_params(job)
+        con = self._connect()
+        con.execute(_SQL_INSERT_JOB, params)
+        return params[0]
+
+    def enqueue_many(self, jobs: Iterable[Dict]) -> List[str]:
+        """
+        Insert jobs with a single executemany in one transaction (one commit
+        for the whole batch). jobs may be a lazy iterable; it is consumed as
+        rows are inserted. Returns the job ids in input order.
+        """
+        job_ids = []
+
+        def rows():
+            for job in jobs:
+                params = self._job_params(job)
+                job_ids.append(params[0])
+                yield params
+
+        with self.transaction():
+            self._connect().executemany(_SQL_INSERT_JOB, rows())
+        return job_ids
+
+    def iter_jobs(self, state: Optional[str] = None, limit: int = 100,
+                  cursor: Optional[Tuple[str, str]] = None) -> Iterator[dict]:
+        """
+        Lazily yield a newest-first page of jobs. cursor is the (updated_at, id) of the last
+        row of the previous page; pass None for the first page.
+        """
         if state and state != "all":
-            q += " WHERE state = ?"
-            params.append(state)
-        q += " ORDER BY updated_at DESC LIMIT ?"
-        params.append(limit)
-        with self._connect() as con:
-            return [dict(r) for r in con.execute(q, params)]
+            if cursor is None:
+                q, params = _SQL_ITER_JOBS_STATE, (state, limit)
+            else:
+                q, params = _SQL_ITER_JOBS_STATE_AFTER, (state, *cursor, limit)
+        elif cursor is None:
+            q, params = _SQL_ITER_JOBS, (limit,)
+        else:
+            q, params = _SQL_ITER_JOBS_AFTER, (*cursor, limit)
+        yield from self._iter_rows(q, params)
 
     def get_job(self, job_id: str) -> Optional[dict]:
-        with self._connect() as con:
-            r = con.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
-            return dict(r) if r else None
+        con = self._connect()
+        r = con.execute(_SQL_GET_JOB, (job_id,)).fetchone()
+        return dict(r) if r else None
 
     def delete_job(self, job_id: str) -> bool:
-        with self._connect() as con:
-            cur = con.execute("DELETE FROM jobs WHERE id=?", (job_id,))
-            return cur.rowcount > 0
-
-    def pop_pending_for_run(self) -> Optional[dict]:
-        # atomically claim one pending job whose eta is null or due
+        con = self._connect()
+        cur = con.execute(_SQL_DELETE_JOB, (job_id,))
+        return cur.rowcount > 0
+
+    def _claim_locked(self, now: float, n: int) -> List[dict]:
+        # claim without RETURNING: BEGIN IMMEDIATE holds the write lock from
+        # the SELECT to the UPDATE, so no other worker can claim the same rows
+        con = self._connect()
+        ts = _now_iso()
+        with self._txn(con):
+            jobs = [dict(r) for r in con.execute(_SQL_SELECT_RUNNABLE, (now, n))]
+            con.executemany(_SQL_MARK_PROCESSING, [(ts, j["id"]) for j in jobs])
+        for j in jobs:
+            j["state"], j["updated_at"] = "processing", ts
+        return jobs
+
+    def pop_pending_for_run(self) -> Tuple[Optional[dict], Optional[float]]:
+        """
+        Atomically claim one runnable job: pending, or failed and waiting on a
+        retry whose eta is null or due. Returns (job, next_eta) where next_eta
+        is the earliest future eta among waiting jobs, or None if there is none.
+        """
         now = time.time()
-        with self._connect() as con:
-            with self._txn(con):
-                row = con.execute("""
-                    SELECT * FROM jobs
-                    WHERE state='pending' AND (eta IS NULL OR eta <= ?)
-                    ORDER BY eta IS NOT NULL, created_at ASC
-                    LIMIT 1
-                """, (now,)).fetchone()
-                if not row:
-                    return None
-                con.execute("UPDATE jobs SET state='processing', updated_at=? WHERE id=?",
-                            (_now_iso(), row["id"]))
-                return dict(row)
+        con = self._connect()
+        if _HAS_RETURNING:
+            # a single UPDATE ... RETURNING is atomic in autocommit mode
+            row = con.execute(_SQL_CLAIM_ONE, (_now_iso(), now)).fetchone()
+            job = dict(row) if row else None
+        else:
+            job = next(iter(self._claim_locked(now, 1)), None)
+        if job:
+            return job, None
+        next_eta = con.execute(_SQL_NEXT_ETA, (now,)).fetchone()[0]
+        return None, next_eta
+
+    def pop_pending_batch(self, n: int = 8) -> Tuple[List[dict], Optional[float]]:
+        """
+        Claim up to n runnable jobs in a single UPDATE ... RETURNING statement
+        (atomic in autocommit mode; a locked SELECT + UPDATE before SQLite
+        3.35). Returns (jobs, next_eta) with jobs in run order; next_eta is
+        only looked up when nothing was claimed, as in pop_pending_for_run.
+        """
+        now = time.time()
+        con = self._connect()
+        if _HAS_RETURNING:
+            rows = con.execute(_SQL_CLAIM_BATCH, (_now_iso(), now, n)).fetchall()
+            # RETURNING order is unspecified; restore the claim order
+            jobs = sorted((dict(r) for r in rows),
+                          key=lambda j: (j["eta"] is not None, j["created_at"]))
+        else:
+            jobs = self._claim_locked(now, n)
+        if jobs:
+            return jobs, None
+        next_eta = con.execute(_SQL_NEXT_ETA, (now,)).fetchone()[0]
+        return [], next_eta
+
+    def release_jobs(self, job_ids: List[str]):
+        """Hand claimed-but-unstarted jobs back to the queue."""
+        con = self._connect()
+        with self._txn(con):
+            con.executemany(_SQL_RELEASE_JOB, [(_now_iso(), job_id) for job_id in job_ids])
 
     def mark_completed(self, job_id: str):
-        with self._connect() as con:
-            con.execute("UPDATE jobs SET state='completed', updated_at=?, eta=NULL WHERE id=?",
-                        (_now_iso(), job_id))
+        con = self._connect()
+        con.execute(_SQL_MARK_COMPLETED, (_now_iso(), job_id))
 
     def mark_failed_retry(self, job_id: str, attempts: int, delay_seconds: float):
         next_eta = time.time() + delay_seconds
-        with self._connect() as con:
-            con.execute("""UPDATE jobs
-                           SET state='failed', attempts=?, eta=?, updated_at=?
-                           WHERE id=?""",
-                        (attempts, next_eta, _now_iso(), job_id))
+        con = self._connect()
+        con.execute(_SQL_MARK_FAILED_RETRY, (attempts, next_eta, _now_iso(), job_id))
 
     def move_to_dlq(self, job_row: dict, last_error: str):
-        payload = json.dumps(job_row)
-        with self._connect() as con:
-            with self._txn(con):
-                con.execute("INSERT INTO dlq(job_id, payload, last_error, failed_at) VALUES(?,?,?,?)",
-                            (job_row["id"], payload, last_error, _now_iso()))
-                con.execute("UPDATE jobs SET state='dead', updated_at=?, eta=NULL WHERE id=?",
-                            (_now_iso(), job_row["id"]))
+        payload = dumps(job_row)
+        con = self._connect()
+        with self._txn(con):
+            con.execute(_SQL_INSERT_DLQ, (job_row["id"], payload, last_error, _now_iso()))
+            con.execute(_SQL_MARK_DEAD, (_now_iso(), job_row["id"]))
 
     def retry_from_dlq(self, job_id: str) -> bool:
-        with self._connect() as con:
-            with self._txn(con):
-                dl = con.execute("SELECT * FROM dlq WHERE job_id=?", (job_id,)).fetchone()
-                if not dl:
-                    return False
-                # reset job to pending
-                con.execute("""UPDATE jobs
-                               SET state='pending', attempts=0, eta=NULL, updated_at=?
-                               WHERE id=?""", (_now_iso(), job_id))
-                con.execute("DELETE FROM dlq WHERE job_id=?", (job_id,))
-                return True
-
-    def list_dlq(self, limit: int = 100) -> list:
-        with self._connect() as con:
-            rows = con.execute("SELECT * FROM dlq ORDER BY failed_at DESC LIMIT ?", (limit,)).fetchall()
-            return [dict(r) for r in rows]
+        con = self._connect()
+        with self._txn(con):
+            dl = con.execute(_SQL_GET_DLQ, (job_id,)).fetchone()
+            if not dl:
+                return False
+            # reset job to pending
+            con.execute(_SQL_RESET_JOB, (_now_iso(), job_id))
+            con.execute(_SQL_DELETE_DLQ, (job_id,))
+            return True
+
+    def iter_dlq(self, limit: int = 100,
+                 cursor: Optional[Tuple[str, int]] = None) -> Iterator[dict]:
+        """
+        Lazily yield a newest-first page of DLQ entries. cursor is the
+        (failed_at, id) of the last row of the previous page; pass None for
+        the first page.
+        """
+        if cursor is None:
+            yield from self._iter_rows(_SQL_ITER_DLQ, (limit,))
+        else:
+            yield from self._iter_rows(_SQL_ITER_DLQ_AFTER, (*cursor, limit))
 
     # ---------- Workers & control ----------
 
     def register_worker(self, pid: int, queues: str = "default"):
-        with self._connect() as con:
-            con.execute("INSERT OR REPLACE INTO workers(pid, started_at, queues) VALUES(?, ?, ?)",
-                        (pid, _now_iso(), queues))
+        con = self._connect()
+        con.execute(_SQL_REGISTER_WORKER, (pid, _now_iso(), queues))
 
     def deregister_worker(self, pid: int):
-        with self._connect() as con:
-            con.execute("DELETE FROM workers WHERE pid=?", (pid,))
+        con = self._connect()
+        con.execute(_SQL_DEREGISTER_WORKER, (pid,))
+
+    def remove_workers(self, pids: Iterable[int]):
+        """Drop several worker rows (e.g. stale PIDs) in one transaction."""
+        with self.transaction():
+            self._connect().executemany(_SQL_DEREGISTER_WORKER, [(pid,) for pid in pids])
+
+    def list_worker_pids(self) -> List[Tuple[int, float]]:
+        """(pid, started_at as epoch seconds) for every registered worker."""
+        con = self._connect()
+        return [(r[0], calendar.timegm(time.strptime(r[1], _ISO_FMT)))
+                for r in con.execute(_SQL_LIST_WORKER_PIDS)]
 
     def list_workers(self) -> list:
-        with self._connect() as con:
-            return [dict(r) for r in con.execute("SELECT * FROM workers", ())]
+        con = self._connect()
+        return [dict(r) for r in con.execute(_SQL_LIST_WORKERS)]
 
     def request_stop(self):
-        with self._connect() as con:
-            con.execute("INSERT OR REPLACE INTO control(k, v) VALUES('stop_requested', '1')")
+        con = self._connect()
+        con.execute(_SQL_REQUEST_STOP)
 
     def clear_stop(self):
-        with self._connect() as con:
-            con.execute("DELETE FROM control WHERE k='stop_requested'")
+        con = self._connect()
+        con.execute(_SQL_CLEAR_STOP)
 
     def is_stop_requested(self) -> bool:
-        with self._connect() as con:
-            r = con.execute("SELECT v FROM control WHERE k='stop_requested'").fetchone()
-            return r is not None
+        con = self._connect()
+        r = con.execute(_SQL_IS_STOP_REQUESTED).fetchone()
+        return r is not None
 
     # ---------- Config ----------
 
     def config_set(self, key: str, value: str):
-        with self._connect() as con:
-            con.execute("INSERT OR REPLACE INTO config(k, v) VALUES(?, ?)", (key, value))
+        con = self._connect()
+        con.execute(_SQL_CONFIG_SET, (key, value))
+        self._cfg_cache.pop(key, None)
 
     def config_get(self, key: str, default: Optional[str] = None) -> str:
-        with self._connect() as con:
-            r = con.execute("SELECT v FROM config WHERE k=?", (key,)).fetchone()
-            return r["v"] if r else default
+        now = time.monotonic()
+        hit = self._cfg_cache.get(key)
+        if hit is None or now - hit[0] >= self._cfg_ttl:
+            con = self._connect()
+            r = con.execute(_SQL_CONFIG_GET, (key,)).fetchone()
+            # cache misses too, so unset keys don't hit the DB on every call
+            hit = (now, r["v"] if r else None)
+            self._cfg_cache[key] = hit
+        return hit[1] if hit[1] is not None else default
 
     def all_config(self) -> dict:
-        with self._connect() as con:
-            rows = con.execute("SELECT k,v FROM config").fetchall()
-            return {r["k"]: r["v"] for r in rows}
+        con = self._connect()
+        rows = con.execute(_SQL_CONFIG_ALL).fetchall()
+        cfg = {r["k"]: r["v"] for r in rows}
+        # warm the cache in one query
+        now = time.monotonic()
+        self._cfg_cache = {k: (now, v) for k, v in cfg.items()}
+        return cfg
 
     # ---------- Stats ----------
     def stats(self) -> dict:
-        with self._connect() as con:
-            by_state = {r["state"]: r["cnt"] for r in con.execute(
-                "SELECT state, COUNT(*) as cnt FROM jobs GROUP BY state"
-            ).fetchall()}
-            total = sum(by_state.values())
-            dlq = con.execute("SELECT COUNT(*) FROM dlq").fetchone()[0]
-            workers = con.execute("SELECT COUNT(*) FROM workers").fetchone()[0]
-            return {"states": by_state, "total": total, "dlq": dlq, "workers": workers}
+        con = self._connect()
+        by_state = {}
+        dlq = workers = 0
+        for k, n in con.execute(_SQL_STATS):
+            if k == "dlq":
+                dlq = n
+            elif k == "workers":
+                workers = n
+            else:
+                by_state[k[len("state_"):]] = n
+        total = sum(by_state.values())
+        return {"states": by_state, "total": total, "dlq": dlq, "workers": workers}
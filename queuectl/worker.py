@@ -1,91 +1,304 @@
 import signal
+import shlex
+import shutil
 import subprocess
 import time
 import os
-from multiprocessing import Process, Event
+from collections import deque
+from functools import lru_cache
+from typing import Optional, Tuple, List
+import psutil
+from multiprocessing import Process
+from multiprocessing.connection import wait as wait_sentinels
+from threading import Event
 from .storage import Storage
 from .backoff import compute_delay
 
+# longest an idle worker sleeps before re-checking the queue for new jobs
+IDLE_DEFAULT_WAIT = 1.0
+# jobs claimed per DB round-trip. Claimed jobs show as 'processing' and are
+# unavailable to other workers until run, so batching is opt-in.
+DEFAULT_BATCH_SIZE = 1
+# seconds start_workers gives a worker to finish its current job after
+# SIGTERM before escalating ('worker stop' waits indefinitely by default)
+STOP_TIMEOUT = 5.0
+# seconds a job's process group gets after SIGTERM before SIGKILL
+JOB_KILL_GRACE = 3.0
+# re-read backoff_base after this many jobs or seconds, whichever comes
+# first (SIGHUP forces an immediate re-read)
+CONFIG_REFRESH_EVERY = 100
+CONFIG_REFRESH_SECONDS = 5.0
+
+# anything that needs /bin/sh to interpret (pipes, redirects, expansion,
+# escapes, ...)
+_SHELL_META = frozenset("|&;<>()$`*?[]{}~#\\\n")
+# shell builtins, including ones that also exist as binaries on PATH but
+# behave differently there (dash's echo expands \n, /usr/bin/echo doesn't)
+_SHELL_BUILTINS = frozenset((
+    "echo", "printf", "test", "kill", "pwd", "cd", "read", "type", "command",
+    "exec", "exit", "export", "set", "unset", "ulimit", "umask", "wait",
+    "times", "trap", "eval", ".", "source", "alias", "hash", "getopts",
+))
+
+@lru_cache(maxsize=256)
+def _direct_argv(command: str) -> Optional[Tuple[str, ...]]:
+    """
+    Split a job command into an argv that can be exec'd without a shell,
+    or return None when the shell is required (metacharacters, variable
+    assignments, builtins). Running the argv directly skips the extra
+    /bin/sh process; resolving the program up front also sends commands
+    that aren't on PATH (builtins, typos) to the shell, which reports them.
+    """
+    if os.name != "posix" or _SHELL_META.intersection(command):
+        return None
+    try:
+        argv = shlex.split(command)
+    except ValueError:
+        return None
+    if not argv or "=" in argv[0] or argv[0] in _SHELL_BUILTINS:
+        return None
+    exe = shutil.which(argv[0])
+    if exe is None:
+        return None
+    return (exe, *argv[1:])
+
+def _signal_job(proc: subprocess.Popen, kill: bool = False):
+    # jobs run in their own session, so the pgid is the job's pid and
+    # killpg reaches the shell and everything it spawned (SIGKILL only
+    # exists on posix; elsewhere terminate/kill the process itself)
+    try:
+        if os.name == "posix":
+            os.killpg(proc.pid, signal.SIGKILL if kill else signal.SIGTERM)
+        elif kill:
+            proc.kill()
+        else:
+            proc.terminate()
+    except (ProcessLookupError, PermissionError):
+        pass
+
 class Worker:
-    def __init__(self, db_path: str):
+    def __init__(self, db_path: str, batch_size: int = DEFAULT_BATCH_SIZE):
         self.db = Storage(db_path)
+        # only ever set by this process's own signal handlers, so a plain
+        # threading.Event is enough (no cross-process semaphore needed)
         self.stop_event = Event()
         self.pid = os.getpid()
+        self.batch_size = max(1, batch_size)
+        # jobs claimed (state='processing') but not started yet
+        self._claimed = deque()
+        # the running job and, once asked to kill it, when to SIGKILL it
+        self._current_proc: Optional[subprocess.Popen] = None
+        self._kill_deadline: Optional[float] = None
+        # backoff_base is read once here and refreshed periodically,
+        # not on every failed attempt
+        self._backoff_base = 2.0
+        self._jobs_since_refresh = 0
+        self._refreshed_at = 0.0
+        self._reload_config = False
+        self._refresh_config()
+
+    def _refresh_config(self):
+        cfg = self.db.all_config()
+        self._backoff_base = float(cfg.get("backoff_base", "2"))
+        self._jobs_since_refresh = 0
+        self._refreshed_at = time.monotonic()
+        self._reload_config = False
+
+    def _handle_reload(self, signum, frame):
+        self._reload_config = True
+
+    def _handle_failure(self, job: dict, attempts: int, max_retries: int, error_text: str):
+        attempts += 1
+        if attempts > max_retries:
+            self.db.move_to_dlq(job, error_text)
+        else:
+            delay = compute_delay(self._backoff_base, attempts)
+            self.db.mark_failed_retry(job["id"], attempts, delay)
 
     def _handle_signal(self, signum, frame):
+        if self.stop_event.is_set():
+            # second signal: stop waiting for the running job
+            proc = self._current_proc
+            if proc is not None and proc.returncode is None and self._kill_deadline is None:
+                _signal_job(proc)
+                self._kill_deadline = time.monotonic() + JOB_KILL_GRACE
         # finish current job gracefully
         self.stop_event.set()
 
+    def _run_job(self, command: str) -> Optional[int]:
+        """
+        Run a job and return its exit code, or None if it was killed because
+        the worker is shutting down (it didn't fail on its own).
+        """
+        argv = _direct_argv(command)
+        if argv is None:
+            proc = subprocess.Popen(command, shell=True, start_new_session=True)
+        else:
+            proc = subprocess.Popen(argv, start_new_session=True)
+        self._current_proc = proc
+        killed = False
+        try:
+            # wait in slices so a pending SIGKILL escalation gets its turn
+            while True:
+                try:
+                    returncode = proc.wait(timeout=0.5)
+                    break
+                except subprocess.TimeoutExpired:
+                    if self._kill_deadline is not None and time.monotonic() >= self._kill_deadline:
+                        _signal_job(proc, kill=True)
+        finally:
+            killed = self._kill_deadline is not None
+            if killed:
+                # we were told to kill it: sweep anything in the group that
+                # ignored SIGTERM and outlived the group leader
+                _signal_job(proc, kill=True)
+            self._current_proc = None
+            self._kill_deadline = None
+        if killed and returncode != 0:
+            return None
+        return returncode
+
     def run_forever(self):
         # register signals
         signal.signal(signal.SIGINT, self._handle_signal)
         signal.signal(signal.SIGTERM, self._handle_signal)
+        if hasattr(signal, "SIGHUP"):
+            signal.signal(signal.SIGHUP, self._handle_reload)
         # register worker
         self.db.register_worker(os.getpid())
         try:
             while not self.stop_event.is_set() and not self.db.is_stop_requested():
-                job = self.db.pop_pending_for_run()
-                if not job:
+                next_eta = None
+                if not self._claimed:
+                    if self.batch_size == 1:
+                        job, next_eta = self.db.pop_pending_for_run()
+                        if job is not None:
+                            self._claimed.append(job)
+                    else:
+                        jobs, next_eta = self.db.pop_pending_batch(self.batch_size)
+                        self._claimed.extend(jobs)
+                if not self._claimed:
                     print("[worker] waiting for jobs...")
-                    time.sleep(1)
+                    # a retry due sooner than the usual poll shortens the
+                    # sleep, never lengthens it (new jobs can arrive at any
+                    # time); a signal sets stop_event and wakes us immediately
+                    wait = IDLE_DEFAULT_WAIT
+                    if next_eta is not None:
+                        wait = min(max(next_eta - time.time(), 0.0), IDLE_DEFAULT_WAIT)
+                    self.stop_event.wait(timeout=wait)
                     continue
+                job = self._claimed.popleft()
                 print(f"[worker] picked job {job['id']} -> {job['command']}")
                 job_id = job["id"]
                 command = job["command"]
                 attempts = int(job["attempts"])
                 max_retries = int(job["max_retries"])
 
+                self._jobs_since_refresh += 1
+                if (self._reload_config
+                        or self._jobs_since_refresh >= CONFIG_REFRESH_EVERY
+                        or time.monotonic() - self._refreshed_at >= CONFIG_REFRESH_SECONDS):
+                    self._refresh_config()
+
                 # Execute the shell command
                 try:
-                    result = subprocess.run(command, shell=True)
-                    if result.returncode == 0:
+                    returncode = self._run_job(command)
+                    if returncode is None:
+                        # killed by shutdown: requeue without spending a retry
+                        print(f"[worker] ↩ {job_id} interrupted by shutdown, back to pending")
+                        self.db.release_jobs([job_id])
+                        continue
+                    if returncode == 0:
                         print(f"[worker] ✅ completed {job_id}")
                         self.db.mark_completed(job_id)
                         continue
                     else:
                         # failure path
-                        print(f"[worker] ❌ failed (attempt {attempts}/{max_retries}) exit={result.returncode}")
-                        attempts += 1
-                        if attempts > max_retries:
-                            self.db.move_to_dlq(job, f"Exit {result.returncode}")
-                        else:
-                            base = float(self.db.config_get("backoff_base", "2"))
-                            delay = compute_delay(base, attempts)
-                            self.db.mark_failed_retry(job_id, attempts, delay)
-                except FileNotFoundError as e:
-                    attempts += 1
-                    if attempts > max_retries:
-                        self.db.move_to_dlq(job, f"FileNotFoundError: {e}")
-                    else:
-                        base = float(self.db.config_get("backoff_base", "2"))
-                        delay = compute_delay(base, attempts)
-                        self.db.mark_failed_retry(job_id, attempts, delay)
+                        print(f"[worker] ❌ failed (attempt {attempts}/{max_retries}) exit={returncode}")
+                        self._handle_failure(job, attempts, max_retries, f"Exit {returncode}")
                 except Exception as e:
-                    attempts += 1
-                    if attempts > max_retries:
-                        self.db.move_to_dlq(job, f"{type(e).__name__}: {e}")
-                    else:
-                        base = float(self.db.config_get("backoff_base", "2"))
-                        delay = compute_delay(base, attempts)
-                        self.db.mark_failed_retry(job_id, attempts, delay)
+                    self._handle_failure(job, attempts, max_retries, f"{type(e).__name__}: {e}")
         finally:
+            if self._claimed:
+                self.db.release_jobs([j["id"] for j in self._claimed])
+                self._claimed.clear()
             self.db.deregister_worker(os.getpid())
 
-def start_workers(db_path: str, count: int):
+def _run_worker(db_path: str, batch_size: int):
+    # build the Worker inside the child so its Storage connection is opened
+    # (and reused for its lifetime) by the process that actually uses it
+    Worker(db_path, batch_size).run_forever()
+
+def _is_running(proc: psutil.Process) -> bool:
+    try:
+        return proc.status() != psutil.STATUS_ZOMBIE
+    except psutil.NoSuchProcess:
+        return False
+
+def _wait_exit(procs: List[psutil.Process], timeout: Optional[float], callback) -> List[psutil.Process]:
+    # like psutil.wait_procs, but a worker that exited and is only waiting to
+    # be reaped by its parent (a zombie) counts as gone; timeout=None waits
+    # for as long as it takes
+    deadline = None if timeout is None else time.monotonic() + timeout
+    alive = procs
+    while alive:
+        step = 1.0 if deadline is None else min(1.0, max(deadline - time.monotonic(), 0.0))
+        _, alive = psutil.wait_procs(alive, timeout=step, callback=callback)
+        alive = [proc for proc in alive if _is_running(proc)]
+        if deadline is not None and time.monotonic() >= deadline:
+            break
+    return alive
+
+def stop_processes(procs: List[psutil.Process], timeout: Optional[float] = STOP_TIMEOUT) -> List[psutil.Process]:
+    """
+    Stop workers with SIGTERM; each finishes its current job and exits.
+    With timeout=None, wait for that however long it takes. Otherwise
+    escalate for workers still alive after `timeout` seconds: a second
+    SIGTERM (kill the job's process group), then after another `timeout`
+    SIGKILL. Returns the processes that had to be killed.
+    """
+    def on_terminate(proc):
+        print(f"[worker] pid {proc.pid} stopped")
+
+    steps = ("terminate",) if timeout is None else ("terminate", "terminate", "kill")
+    alive = procs
+    killed = []
+    for step in steps:
+        if not alive:
+            return []
+        for proc in alive:
+            try:
+                getattr(proc, step)()
+            except psutil.NoSuchProcess:
+                pass
+        killed = alive
+        alive = _wait_exit(alive, timeout, on_terminate)
+    return killed if timeout is not None else []
+
+def start_workers(db_path: str, count: int, batch_size: int = DEFAULT_BATCH_SIZE):
     procs = []
     for _ in range(count):
-        w = Worker(db_path)
-        p = Process(target=w.run_forever, daemon=False)
+        p = Process(target=_run_worker, args=(db_path, batch_size), daemon=False)
         p.start()
         procs.append(p)
-    # wait
+    # wait, reaping each worker as soon as it exits (not in start order)
     try:
-        for p in procs:
-            p.join()
+        pending = procs
+        while pending:
+            wait_sentinels([p.sentinel for p in pending])
+            pending = [p for p in pending if p.is_alive()]
     except KeyboardInterrupt:
         pass
     finally:
+        alive = []
         for p in procs:
             if p.is_alive():
-                p.terminate()
-                p.join()
+                try:
+                    alive.append(psutil.Process(p.pid))
+                except psutil.NoSuchProcess:
+                    pass
+        if alive:
+            # on Ctrl-C the workers already got SIGINT from the terminal;
+            # let them finish their current job before escalating
+            alive = _wait_exit(alive, STOP_TIMEOUT, None)
+        stop_processes(alive)